@@ -17,17 +17,59 @@ Or with Flask CLI:
 
 import os
 import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from itertools import chain
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
-from flask import Flask, request, jsonify, send_file, Response
+from flask import Flask, request, jsonify, send_from_directory, Response
 from flask_cors import CORS
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
 from tts_module import TTSEngine
 
+# orjson (Rust, SIMD) menyerialisasi dict kecil 2-10x lebih cepat dari
+# json stdlib - optional, fallback ke flask.jsonify
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # ========================================
 # Configuration
 # ========================================
 
+# Logging non-blocking: thread request hanya enqueue record, QueueListener
+# yang menulis ke stdout. Menghindari kontensi lock stdout antar worker.
+log = logging.getLogger(__name__)
+
+
+def _setup_logging():
+    root = logging.getLogger()
+    if root.handlers:  # sudah dikonfigurasi (mis. oleh gunicorn)
+        return
+    log_queue = queue.Queue(-1)
+    listener = QueueListener(log_queue, logging.StreamHandler())
+    listener.start()
+    root.addHandler(QueueHandler(log_queue))
+    root.setLevel(logging.INFO)
+
+
+_setup_logging()
+
 app = Flask(__name__)
 
+# Delegasi transfer file audio ke nginx via X-Accel-Redirect (zero-copy
+# sendfile di kernel). Butuh location internal /_audio_output/ dan
+# /_audio_cache/ di nginx - lihat README "Production Notes".
+app.config['USE_XACCEL'] = os.environ.get('USE_XACCEL', 'false').lower() == 'true'
+
+# Audio yang di-serve boleh di-cache browser selama 1 jam
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 3600
+
 # Enable CORS for all routes (adjust origins for production)
 CORS(app, resources={
     r"/*": {
@@ -37,26 +79,212 @@ CORS(app, resources={
     }
 })
 
-# TTS Engine instance
-tts_engine = TTSEngine(lang='id', slow=False)
+# Preflight CORS dijawab dari header yang dibangun sekali di sini, tanpa
+# melewati evaluasi regex resource flask_cors per request OPTIONS
+_CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type, Authorization',
+    'Access-Control-Max-Age': '600'
+}
+
+
+@app.before_request
+def _fast_preflight():
+    """Jawab preflight OPTIONS langsung dengan header precomputed."""
+    if request.method == 'OPTIONS':
+        return Response('', 204, _CORS_HEADERS)
+
+
+# TTS Engine pool - satu instance per (lang, slow) supaya model/ONNX session
+# tidak di-reload per request
+@lru_cache(maxsize=8)
+def get_engine(lang='id', slow=False):
+    """Reuse TTSEngine instance untuk kombinasi (lang, slow)."""
+    return TTSEngine(lang=lang, slow=slow)
+
+
+# Default engine (dipakai untuk serve audio & cleanup)
+tts_engine = get_engine(lang='id', slow=False)
 
 # Cleanup interval (in seconds)
 CLEANUP_INTERVAL = 3600  # 1 hour
 last_cleanup_time = time.time()
 
+# Nilai query-string yang dianggap true - set membership sekali, tanpa
+# alokasi .lower() per request
+_TRUE = frozenset({'true', '1', 'yes', 'on', 'TRUE', 'True'})
+
+# Limit text length (prevent abuse)
+MAX_TEXT_LENGTH = 5000
+
+# Tabel translate untuk membuang karakter kontrol C0/C1 (kecuali tab,
+# newline, CR) dalam satu pass C-loop, bukan loop per karakter di Python
+_CTRL_DELETE = {c: None for c in range(32) if c not in (9, 10, 13)}
+_CTRL_DELETE.update({c: None for c in range(127, 160)})
+
 
 # ========================================
 # Helper Functions
 # ========================================
 
+def ojsonify(obj):
+    """jsonify berbasis orjson; fallback ke flask.jsonify jika absen."""
+    if orjson is not None:
+        return Response(orjson.dumps(obj), mimetype='application/json')
+    return jsonify(obj)
+
+
+def _audio_mimetype(filename):
+    """Mimetype untuk file audio berdasarkan ekstensi."""
+    return 'audio/wav' if str(filename).endswith('.wav') else 'audio/mpeg'
+
+
+def _xaccel_response(internal_prefix, filename):
+    """
+    Response X-Accel-Redirect: Python hanya mengirim header, nginx yang
+    mengirim byte file via sendfile(2).
+    """
+    r = Response()
+    r.headers['X-Accel-Redirect'] = internal_prefix + filename
+    r.headers['Content-Type'] = _audio_mimetype(filename)
+    return r
+
+
+# Request-coalescing + micro-batching: request /tts yang miss cache masuk
+# job queue. Broker mengumpulkan job dalam window 20ms, deduplikasi per
+# cache key (burst teks identik = 1 sintesis untuk semua waiter), lalu
+# teks unik disintesis paralel di thread pool kecil. Juga menghilangkan
+# race saat dua request menulis file cache yang sama.
+_BATCH_WINDOW = 0.02   # detik - batas tunggu pengumpulan satu batch
+_BATCH_MAX = 32        # batas jumlah job per batch
+_inflight = {}
+_inflight_lock = threading.Lock()
+_job_queue = queue.Queue()
+_synth_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix='tts-synth')
+
+
+def _synthesize_for_waiters(key, engine, text, futures):
+    """Sintesis satu teks unik dan sebarkan hasil ke semua waiter-nya."""
+    try:
+        result = engine.generate_audio(text, use_cache=True)
+        for future in futures:
+            future.set_result(result)
+    except Exception as e:
+        for future in futures:
+            future.set_exception(e)
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+
+def _batch_worker():
+    """Consumer job queue: kumpulkan burst, dedupe, lalu dispatch."""
+    while True:
+        jobs = [_job_queue.get()]
+        deadline = time.monotonic() + _BATCH_WINDOW
+        while len(jobs) < _BATCH_MAX:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                jobs.append(_job_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        # Dedupe per key: satu sintesis per teks unik di batch ini
+        by_key = {}
+        for key, engine, text, future in jobs:
+            entry = by_key.setdefault(key, (engine, text, []))
+            entry[2].append(future)
+
+        for key, (engine, text, futures) in by_key.items():
+            _synth_pool.submit(_synthesize_for_waiters, key, engine, text, futures)
+
+
+threading.Thread(target=_batch_worker, daemon=True, name='tts-batcher').start()
+
+
+def generate_audio_coalesced(engine, text, timeout=10):
+    """
+    Generate audio lewat broker, dengan deduplikasi request identik
+    yang sedang berjalan (inflight) maupun yang datang dalam satu
+    window batching.
+    """
+    # Cache hit tidak perlu antre di broker
+    cached_path = engine._get_cached_path(text)
+    if cached_path:
+        return cached_path
+
+    key = engine._get_cache_key(text)
+
+    with _inflight_lock:
+        future = _inflight.get(key)
+        if future is None:
+            future = Future()
+            _inflight[key] = future
+            _job_queue.put((key, engine, text, future))
+
+    # Tunggu hasil sintesis (milik request ini atau request identik lain)
+    return future.result(timeout=timeout)
+
+
+def stream_audio_coalesced(engine, text, timeout=10):
+    """
+    Generator chunk audio yang terdaftar di peta inflight: burst
+    stream=true dengan teks identik hanya memanggil gTTS sekali -
+    follower menunggu file cache milik leader lalu stream dari situ.
+    """
+    # Cache hit langsung stream dari file, tanpa antre inflight
+    cached_path = engine._get_cached_path(text)
+    if cached_path:
+        return engine._read_chunks(cached_path)
+
+    key = engine._get_cache_key(text)
+
+    with _inflight_lock:
+        future = _inflight.get(key)
+        is_leader = future is None
+        if is_leader:
+            future = Future()
+            _inflight[key] = future
+
+    if not is_leader:
+        # Sintesis teks sama sedang berjalan - tunggu file hasilnya
+        audio_path = future.result(timeout=timeout)
+        if audio_path:
+            return engine._read_chunks(audio_path)
+        return engine.stream_audio(text)
+
+    def gen():
+        try:
+            yield from engine.stream_audio(text)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            # File cache sudah di-rename final oleh stream_audio
+            future.set_result(engine._get_cached_path(text))
+        finally:
+            # Leader batal di tengah (client disconnect): bangunkan
+            # follower dengan CancelledError, jangan biarkan menggantung
+            if not future.done():
+                future.cancel()
+            with _inflight_lock:
+                _inflight.pop(key, None)
+
+    return gen()
+
+
 def run_periodic_cleanup():
     """Run periodic cleanup of old audio files."""
     global last_cleanup_time
     current_time = time.time()
     
+    # Cache dibersihkan incremental via LRU eviction di TTSEngine,
+    # jadi hanya output dir yang perlu di-sweep periodik
     if current_time - last_cleanup_time > CLEANUP_INTERVAL:
         tts_engine.clean_output(max_age_hours=1)
-        tts_engine.clean_cache(max_files=100)
         last_cleanup_time = current_time
 
 
@@ -67,7 +295,7 @@ def run_periodic_cleanup():
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint."""
-    return jsonify({
+    return ojsonify({
         'status': 'healthy',
         'service': 'CarubaAI Backend',
         'version': '1.0.0',
@@ -75,7 +303,7 @@ def health_check():
     })
 
 
-@app.route('/tts', methods=['GET', 'POST'])
+@app.route('/tts', methods=['GET', 'POST'], provide_automatic_options=False)
 def text_to_speech():
     """
     Text-to-Speech endpoint.
@@ -101,62 +329,80 @@ def text_to_speech():
         - If stream=false: JSON with audio URL
     """
     run_periodic_cleanup()
-    
+
+    is_get = request.method == 'GET'
+
     try:
         # Get parameters from request
-        if request.method == 'GET':
-            text = request.args.get('text', '').strip()
+        if is_get:
+            raw = request.args.get('text') or ''
             lang = request.args.get('lang', 'id')
-            slow = request.args.get('slow', 'false').lower() == 'true'
-            stream = request.args.get('stream', 'false').lower() == 'true'
+            slow = request.args.get('slow', '') in _TRUE
+            stream = request.args.get('stream', '') in _TRUE
         else:  # POST
-            data = request.get_json() or {}
-            text = data.get('text', '').strip()
+            # silent=True: body invalid jadi {} tanpa raise; cache=False:
+            # skip bookkeeping cache JSON Werkzeug (body dibaca sekali)
+            data = request.get_json(silent=True, cache=False) or {}
+            raw = data.get('text') or ''
             lang = data.get('lang', 'id')
-            slow = data.get('slow', False)
-            stream = data.get('stream', False)
-        
-        # Validate text
+            slow = bool(data.get('slow'))
+            stream = bool(data.get('stream'))
+
+        # Tolak payload oversized di nilai mentah dulu - tanpa membayar
+        # alokasi .strip() untuk request abuse (margin 64 utk whitespace)
+        if len(raw) > MAX_TEXT_LENGTH + 64:
+            return ojsonify({
+                'success': False,
+                'error': f'Text too long. Maximum {MAX_TEXT_LENGTH} characters allowed.'
+            }), 400
+
+        # Buang karakter kontrol dalam satu pass, lalu validate
+        text = raw.strip().translate(_CTRL_DELETE)
         if not text:
-            return jsonify({
+            return ojsonify({
                 'success': False,
                 'error': 'Text parameter is required'
             }), 400
-        
-        # Limit text length (prevent abuse)
-        MAX_TEXT_LENGTH = 5000
+
         if len(text) > MAX_TEXT_LENGTH:
-            return jsonify({
+            return ojsonify({
                 'success': False,
                 'error': f'Text too long. Maximum {MAX_TEXT_LENGTH} characters allowed.'
             }), 400
         
-        # Create engine with specified parameters
-        engine = TTSEngine(lang=lang, slow=slow)
-        
+        # Reuse pooled engine for specified parameters
+        engine = get_engine(lang=lang, slow=slow)
+
+        # Stream mode: pipe chunk gTTS langsung ke response (TTFB =
+        # chunk pertama, tanpa save-then-send). Chunk pertama di-prime di
+        # sini, di dalam try: kegagalan koneksi/sintesis sebelum byte 0
+        # masih lewat jalur JSON 500, bukan 200 terpotong di tengah WSGI.
+        if stream:
+            gen = stream_audio_coalesced(engine, text)
+            first = next(gen, b'')
+            return Response(
+                chain((first,), gen),
+                mimetype=_audio_mimetype(engine.suffix)
+            )
+
         # Generate audio
-        audio_path = engine.generate_audio(text, use_cache=True)
-        
+        audio_path = generate_audio_coalesced(engine, text)
+
         if not audio_path:
-            return jsonify({
+            return ojsonify({
                 'success': False,
                 'error': 'Failed to generate audio'
             }), 500
         
-        # Return audio file directly if stream mode
-        if stream:
-            return send_file(
-                audio_path,
-                mimetype='audio/mpeg',
-                as_attachment=False,
-                download_name='speech.mp3'
-            )
-        
-        # Return JSON with audio URL
-        audio_filename = Path(audio_path).name
+        # Return JSON with audio URL. Output disimpan di subdir bucket
+        # per jam, jadi URL memakai path relatif terhadap output dir.
+        if audio_path.startswith(engine._output_dir_str):
+            audio_filename = audio_path[len(engine._output_dir_str):].replace(os.sep, '/')
+        else:
+            audio_filename = Path(audio_path).name
         audio_url = request.host_url.rstrip('/') + f'/audio/{audio_filename}'
         
-        return jsonify({
+        return ojsonify({
             'success': True,
             'audio_url': audio_url,
             'audio_path': audio_path,
@@ -165,81 +411,85 @@ def text_to_speech():
         })
         
     except Exception as e:
-        print(f"❌ TTS Error: {e}")
-        return jsonify({
+        log.error("❌ TTS Error: %s", e)
+        return ojsonify({
             'success': False,
             'error': str(e)
         }), 500
 
 
-@app.route('/audio/<path:filename>', methods=['GET'])
+@app.route('/audio/<path:filename>', methods=['GET'], provide_automatic_options=False)
 def serve_audio(filename):
     """
     Serve audio files from cache or output directory.
+
+    send_from_directory memvalidasi path via safe_join (anti path
+    traversal) dan memakai wsgi.file_wrapper, yang di gunicorn+gevent
+    berarti sendfile(2) zero-copy alih-alih Python membaca file.
     """
-    # Check in output directory first
-    output_path = tts_engine.output_dir / filename
-    if output_path.exists():
-        return send_file(
-            str(output_path),
-            mimetype='audio/mpeg',
-            as_attachment=False
-        )
-    
-    # Check in cache directory
-    cache_path = tts_engine.cache_dir / filename
-    if cache_path.exists():
-        return send_file(
-            str(cache_path),
-            mimetype='audio/mpeg',
-            as_attachment=False
-        )
-    
-    return jsonify({
+    # Nama file turunan hash konten - byte di balik URL tidak pernah
+    # berubah, jadi boleh immutable + revalidasi ETag/304
+    for internal_prefix, directory in (
+        ('/_audio_output/', tts_engine._output_dir_str),
+        ('/_audio_cache/', tts_engine._cache_dir_str)
+    ):
+        if app.config['USE_XACCEL']:
+            safe_path = safe_join(directory, filename)
+            if safe_path and os.path.isfile(safe_path):
+                return _xaccel_response(internal_prefix, filename)
+            continue
+        try:
+            resp = send_from_directory(
+                directory,
+                filename,
+                mimetype=_audio_mimetype(filename),
+                as_attachment=False,
+                conditional=True,
+                etag=True,
+                max_age=31536000
+            )
+        except NotFound:
+            continue
+        resp.headers['Cache-Control'] = 'public, immutable, max-age=31536000'
+        return resp
+
+    return ojsonify({
         'success': False,
         'error': 'Audio file not found'
     }), 404
 
 
-@app.route('/tts/stream', methods=['POST'])
+@app.route('/tts/stream', methods=['POST'], provide_automatic_options=False)
 def tts_stream():
     """
     Direct audio streaming endpoint.
     Returns audio directly without saving to file first.
     """
     try:
-        data = request.get_json() or {}
-        text = data.get('text', '').strip()
+        data = request.get_json(silent=True, cache=False) or {}
+        text = (data.get('text') or '').strip()
         lang = data.get('lang', 'id')
-        slow = data.get('slow', False)
+        slow = bool(data.get('slow'))
         
         if not text:
-            return jsonify({
+            return ojsonify({
                 'success': False,
                 'error': 'Text parameter is required'
             }), 400
         
-        # Generate audio
-        engine = TTSEngine(lang=lang, slow=slow)
-        audio_path = engine.generate_audio(text, use_cache=True)
-        
-        if not audio_path:
-            return jsonify({
-                'success': False,
-                'error': 'Failed to generate audio'
-            }), 500
-        
-        # Stream the audio file
-        return send_file(
-            audio_path,
-            mimetype='audio/mpeg',
-            as_attachment=False,
-            download_name='speech.mp3'
+        # Stream chunk audio langsung tanpa save-then-send (pooled
+        # engine). Prime chunk pertama di dalam try - lihat /tts.
+        engine = get_engine(lang=lang, slow=slow)
+        gen = stream_audio_coalesced(engine, text)
+        first = next(gen, b'')
+        return Response(
+            chain((first,), gen),
+            mimetype=_audio_mimetype(engine.suffix)
         )
         
     except Exception as e:
-        print(f"❌ TTS Stream Error: {e}")
-        return jsonify({
+        log.error("❌ TTS Stream Error: %s", e)
+        return ojsonify({
             'success': False,
             'error': str(e)
         }), 500
@@ -251,7 +501,7 @@ def tts_stream():
 
 @app.errorhandler(404)
 def not_found(error):
-    return jsonify({
+    return ojsonify({
         'success': False,
         'error': 'Endpoint not found'
     }), 404
@@ -259,7 +509,7 @@ def not_found(error):
 
 @app.errorhandler(500)
 def internal_error(error):
-    return jsonify({
+    return ojsonify({
         'success': False,
         'error': 'Internal server error'
     }), 500
@@ -282,10 +532,23 @@ if __name__ == '__main__':
     print(f"🌐 Port: {port}")
     print(f"🔧 Debug: {debug}")
     print("=" * 50)
-    
-    # Run the Flask app
-    app.run(
-        host='0.0.0.0',  # Allow connections from other devices
-        port=port,
-        debug=debug
-    )
+
+    if debug:
+        # Dev server Werkzeug (single-threaded) - hanya untuk development
+        app.run(
+            host='0.0.0.0',  # Allow connections from other devices
+            port=port,
+            debug=True
+        )
+    else:
+        # Production: gunicorn dengan worker gevent supaya request TTS
+        # yang I/O-bound tidak saling memblokir
+        workers = os.environ.get('WEB_CONCURRENCY', str(os.cpu_count() or 4))
+        os.execvp('gunicorn', [
+            'gunicorn',
+            '-k', 'gevent',
+            '-w', workers,
+            '--worker-connections', '1000',
+            '--bind', f'0.0.0.0:{port}',
+            'app:app'
+        ])
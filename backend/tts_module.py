@@ -4,73 +4,218 @@ TTS Module - Modul Text-to-Speech Modular
 Modul ini dapat digunakan kembali di proyek lain.
 
 Dependencies:
-- gTTS (Google Text-to-Speech)
+- piper-tts (Local TTS model - optional, untuk sintesis offline tanpa network)
+- gTTS (Google Text-to-Speech - fallback jika model lokal tidak tersedia)
 - pydub (Audio processing - optional, untuk konversi format)
 
 Install:
     pip install gTTS pydub
+    pip install piper-tts  # optional, untuk model lokal
 
 Usage:
     from tts_module import TTSEngine, text_to_speech
-    
+
     # Method 1: Using class
     engine = TTSEngine(lang='id')
     engine.generate_audio("Halo dunia!", "output.mp3")
-    
+
     # Method 2: Using helper function
     text_to_speech("Halo dunia!", "output.mp3", lang="id")
 """
 
 import os
+import time
 import uuid
+import wave
 import hashlib
+import logging
+from collections import OrderedDict
 from pathlib import Path
 from typing import Optional
 from gtts import gTTS
 
+log = logging.getLogger(__name__)
+
+# xxHash (XXH3, SSE4.2/AVX2 - memproses teks pada kecepatan memori) dan
+# BLAKE3 (hash SIMD) optional - fallback ke SHA-256 (OpenSSL pakai SHA-NI
+# otomatis di CPU modern), semuanya lebih cepat dari MD5 untuk payload 5KB.
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+try:
+    import blake3
+except ImportError:
+    blake3 = None
+
+# Piper (model TTS lokal) bersifat optional. Jika terinstall dan ada file
+# voice .onnx, sintesis berjalan in-process tanpa network round-trip.
+try:
+    from piper import PiperVoice
+except ImportError:
+    PiperVoice = None
+
+# Direktori default di-resolve dan dibuat sekali saat import, bukan per
+# konstruksi TTSEngine (Path(__file__) + mkdir itu cold-path overhead).
+_MOD_DIR = Path(__file__).resolve().parent
+_DEFAULT_CACHE = _MOD_DIR / "audio_cache"
+_DEFAULT_OUTPUT = _MOD_DIR / "audio_output"
+_DEFAULT_CACHE.mkdir(parents=True, exist_ok=True)
+_DEFAULT_OUTPUT.mkdir(parents=True, exist_ok=True)
+
 
 class TTSEngine:
     """
-    Engine TTS yang stabil menggunakan Google TTS.
+    Engine TTS dengan model lokal Piper (jika tersedia), fallback ke Google TTS.
     Mendukung caching audio untuk efisiensi.
     """
-    
-    def __init__(self, lang: str = 'id', slow: bool = False, cache_dir: Optional[str] = None):
+
+    # Voice Piper di-load sekali dan dishare antar instance (ONNX session
+    # mahal untuk di-load, jangan per-request).
+    _piper_voice = None
+    _piper_voice_lang = None
+    _piper_loaded = False
+
+    # Index LRU dishare per direktori cache: engine pool (satu instance
+    # per (lang, slow)) menulis ke audio_cache yang sama, jadi index dan
+    # eviction harus melihat satu urutan akses, bukan view per instance.
+    _lru_by_dir = {}
+
+    def __init__(self, lang: str = 'id', slow: bool = False, cache_dir: Optional[str] = None,
+                 cache_max_files: int = 100):
         """
         Initialize TTSEngine.
-        
+
         Args:
             lang: Kode bahasa (default: 'id' untuk Indonesia)
             slow: Bicara lambat atau normal (default: False)
             cache_dir: Direktori untuk cache audio (optional)
+            cache_max_files: Batas jumlah file di cache (LRU eviction)
         """
         self.lang = lang
         self.slow = slow
-        
-        # Setup cache directory
+
+        # Setup cache directory (default sudah dibuat saat import)
         if cache_dir:
             self.cache_dir = Path(cache_dir)
+            if not self.cache_dir.exists():
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
         else:
-            self.cache_dir = Path(__file__).parent / "audio_cache"
-        
-        self.cache_dir.mkdir(parents=True, exist_ok=True)
-        
+            self.cache_dir = _DEFAULT_CACHE
+
         # Output directory for generated files
-        self.output_dir = Path(__file__).parent / "audio_output"
-        self.output_dir.mkdir(parents=True, exist_ok=True)
-    
+        self.output_dir = _DEFAULT_OUTPUT
+
+        # Local voice model - hanya dipakai jika lang engine cocok dengan
+        # bahasa voice yang ter-load (voice id tidak bisa melafalkan lang
+        # lain) dan slow tidak diminta (Piper tidak punya mode slow);
+        # selain itu tetap fallback ke gTTS
+        voice = self._load_piper_voice()
+        if voice is not None and (self.lang != self._piper_voice_lang or self.slow):
+            voice = None
+        self.voice = voice
+
+        # Model lokal menghasilkan WAV, Google TTS menghasilkan MP3
+        self.suffix = '.wav' if self.voice else '.mp3'
+
+        # Prefix string untuk path cache/output - lookup via os.path.exists
+        # lebih murah daripada konstruksi Path + .exists() per request
+        self._cache_dir_str = str(self.cache_dir) + os.sep
+        self._output_dir_str = str(self.output_dir) + os.sep
+
+        # Suffix cache key (lang + slow) di-encode sekali, bukan per hash
+        self._key_tail = f"_{self.lang}_{'1' if self.slow else '0'}".encode()
+
+        # Index LRU in-memory untuk cache: key -> path. Eviction jadi O(1)
+        # per write, menggantikan scan glob+sort periodik atas seluruh dir.
+        # Satu index per direktori (class-level), di-seed sekali dari isi
+        # disk (terlama dulu = kandidat evict pertama).
+        self.cache_max_files = cache_max_files
+        lru = TTSEngine._lru_by_dir.get(self._cache_dir_str)
+        if lru is None:
+            lru = OrderedDict()
+            existing = [f for f in self.cache_dir.iterdir() if f.suffix in ('.mp3', '.wav')]
+            existing.sort(key=lambda f: f.stat().st_mtime)
+            for f in existing:
+                lru[f.stem] = str(f)
+            TTSEngine._lru_by_dir[self._cache_dir_str] = lru
+        self._lru = lru
+
+    @classmethod
+    def _load_piper_voice(cls):
+        """
+        Load voice Piper sekali (singleton di level class).
+
+        Voice file dicari dari env var PIPER_VOICE, atau file id_ID-*.onnx
+        di direktori modul. Return None jika piper tidak terinstall atau
+        voice file tidak ditemukan.
+        """
+        if cls._piper_loaded:
+            return cls._piper_voice
+
+        cls._piper_loaded = True
+
+        if PiperVoice is None:
+            return None
+
+        try:
+            voice_path = os.environ.get('PIPER_VOICE')
+            if not voice_path:
+                candidates = sorted(_MOD_DIR.glob("id_ID-*.onnx"))
+                if not candidates:
+                    return None
+                voice_path = str(candidates[0])
+
+            cls._piper_voice = PiperVoice.load(voice_path)
+            # Nama voice Piper berformat <lang>_<REGION>-... (id_ID-...)
+            cls._piper_voice_lang = os.path.basename(voice_path).split('_', 1)[0]
+            log.info("✅ Piper voice loaded: %s (lang=%s)", voice_path, cls._piper_voice_lang)
+        except Exception as e:
+            log.warning("⚠️ Piper voice unavailable, falling back to gTTS: %s", e)
+            cls._piper_voice = None
+
+        return cls._piper_voice
+
     def _get_cache_key(self, text: str) -> str:
         """Generate cache key dari text."""
-        # Create hash dari text + lang + slow untuk unique key
-        content = f"{text}_{self.lang}_{self.slow}"
-        return hashlib.md5(content.encode()).hexdigest()
+        # Hash dari text + lang + slow untuk unique key, di-feed
+        # incremental supaya tidak ada alokasi string gabungan
+        # f"{text}_{lang}_{slow}" (len(text)+20 byte) per call.
+        # Digest dipotong ke 32 hex chars, sama seperti MD5 sebelumnya.
+        if xxhash is not None:
+            h = xxhash.xxh3_128()
+        elif blake3 is not None:
+            h = blake3.blake3()
+        else:
+            h = hashlib.sha256()
+        h.update(text.encode())
+        h.update(self._key_tail)
+        return h.hexdigest()[:32]
     
-    def _get_cached_path(self, text: str) -> Optional[Path]:
+    @staticmethod
+    def _link_or_copy(src, dst):
+        """
+        Duplikasi file via hardlink (O(1), tanpa menyalin byte).
+        Cache dan output dir satu filesystem (sama-sama di folder modul),
+        jadi hardlink aman; copy hanya sebagai fallback.
+        """
+        try:
+            os.link(src, dst)
+        except FileExistsError:
+            pass
+        except OSError:
+            import shutil
+            shutil.copy(src, dst)
+
+    def _get_cached_path(self, text: str) -> Optional[str]:
         """Check if audio sudah di-cache."""
         cache_key = self._get_cache_key(text)
-        cache_path = self.cache_dir / f"{cache_key}.mp3"
-        
-        if cache_path.exists():
+        cache_path = self._cache_dir_str + cache_key + self.suffix
+
+        if os.path.exists(cache_path):
+            if cache_key in self._lru:
+                self._lru.move_to_end(cache_key)
             return cache_path
         return None
     
@@ -93,82 +238,157 @@ class TTSEngine:
             # Clean text
             text = text.strip()
             
-            print(f"🔊 TTS Generating: {text[:50]}...")
+            # Guard supaya slicing/formatting tidak jalan saat INFO dimatikan
+            if log.isEnabledFor(logging.INFO):
+                log.info("🔊 TTS Generating: %s...", text[:50])
             
             # Check cache first
             if use_cache:
                 cached_path = self._get_cached_path(text)
                 if cached_path:
-                    print(f"✅ Audio from cache: {cached_path}")
+                    log.info("✅ Audio from cache: %s", cached_path)
                     # If specific output path requested, copy from cache
                     if output_path:
-                        import shutil
-                        shutil.copy(cached_path, output_path)
+                        self._link_or_copy(cached_path, output_path)
                         return output_path
-                    return str(cached_path)
+                    return cached_path
             
-            # Generate output path if not provided
+            # Generate output path if not provided.
+            # Output dikelompokkan per jam (subdir bucket) supaya cleanup
+            # cukup rmtree bucket lama, bukan stat semua file.
             if not output_path:
+                bucket = time.strftime("%Y%m%dT%H")
+                bucket_dir = self._output_dir_str + bucket
+                if not os.path.isdir(bucket_dir):
+                    os.makedirs(bucket_dir, exist_ok=True)
                 unique_id = str(uuid.uuid4())[:8]
-                output_path = str(self.output_dir / f"tts_{unique_id}.mp3")
-            
-            # Menggunakan Google TTS (Stabil & Hasil Natural)
-            tts = gTTS(text=text, lang=self.lang, slow=self.slow)
-            tts.save(output_path)
-            
+                output_path = bucket_dir + os.sep + f"tts_{unique_id}{self.suffix}"
+
+            if self.voice:
+                # Model lokal: inference in-process, tanpa network.
+                # piper-tts 1.3+ mengganti synthesize(text, wav_file)
+                # dengan synthesize_wav (synthesize jadi iterator chunk).
+                with wave.open(output_path, 'wb') as wf:
+                    if hasattr(self.voice, 'synthesize_wav'):
+                        self.voice.synthesize_wav(text, wf)
+                    else:
+                        self.voice.synthesize(text, wf)
+            else:
+                # Menggunakan Google TTS (Stabil & Hasil Natural)
+                tts = gTTS(text=text, lang=self.lang, slow=self.slow)
+                tts.save(output_path)
+
             # Save to cache
             if use_cache:
                 cache_key = self._get_cache_key(text)
-                cache_path = self.cache_dir / f"{cache_key}.mp3"
-                import shutil
-                shutil.copy(output_path, cache_path)
+                cache_path = self._cache_dir_str + cache_key + self.suffix
+                self._link_or_copy(output_path, cache_path)
+                self._cache_record(cache_key, cache_path)
             
-            print(f"✅ Audio saved: {output_path}")
+            log.info("✅ Audio saved: %s", output_path)
             return output_path
             
         except Exception as e:
-            print(f"❌ Error TTS: {e}")
+            log.error("❌ Error TTS: %s", e)
             return None
     
-    def clean_cache(self, max_files: int = 100):
+    @staticmethod
+    def _read_chunks(path: str, chunk_size: int = 64 * 1024):
+        """Yield isi file per chunk untuk streaming response."""
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+    def stream_audio(self, text: str, use_cache: bool = True):
         """
-        Bersihkan cache jika melebihi jumlah file tertentu.
-        Menghapus file paling lama.
+        Generator chunk audio untuk streaming HTTP response.
+
+        Untuk gTTS, chunk di-yield langsung saat diterima dari Google
+        (byte pertama sampai ke client tanpa menunggu download penuh +
+        tulis disk + baca ulang), sambil ditampung untuk ditulis sekali
+        ke cache setelah selesai. Cache hit dan backend lokal (WAV butuh
+        header lengkap) di-stream dari file.
         """
-        try:
-            cache_files = list(self.cache_dir.glob("*.mp3"))
-            
-            if len(cache_files) > max_files:
-                # Sort by modification time (oldest first)
-                cache_files.sort(key=lambda f: f.stat().st_mtime)
-                
-                # Remove oldest files
-                files_to_remove = len(cache_files) - max_files
-                for f in cache_files[:files_to_remove]:
-                    f.unlink()
-                    print(f"🗑️ Removed cache: {f.name}")
-                    
-        except Exception as e:
-            print(f"❌ Error cleaning cache: {e}")
+        text = text.strip()
+
+        if use_cache:
+            cached_path = self._get_cached_path(text)
+            if cached_path:
+                log.info("✅ Audio from cache: %s", cached_path)
+                yield from self._read_chunks(cached_path)
+                return
+
+        if self.voice:
+            audio_path = self.generate_audio(text, use_cache=use_cache)
+            if audio_path:
+                yield from self._read_chunks(audio_path)
+            return
+
+        if log.isEnabledFor(logging.INFO):
+            log.info("🔊 TTS Streaming: %s...", text[:50])
+
+        tts = gTTS(text=text, lang=self.lang, slow=self.slow)
+        chunks = []
+        for chunk in tts.stream():
+            chunks.append(chunk)
+            yield chunk
+
+        if use_cache and chunks:
+            # Tulis ke nama temp lalu rename atomik: nama cache final
+            # tidak pernah terlihat setengah jadi (file kosong akan
+            # dianggap hit valid dan di-serve immutable oleh serve_audio)
+            cache_key = self._get_cache_key(text)
+            cache_path = self._cache_dir_str + cache_key + self.suffix
+            tmp_path = f"{cache_path}.{uuid.uuid4().hex[:8]}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(b"".join(chunks))
+            os.replace(tmp_path, cache_path)
+            self._cache_record(cache_key, cache_path)
+
+    def _cache_record(self, cache_key: str, cache_path: str):
+        """
+        Catat entry cache baru di index LRU dan evict yang terlama
+        jika melebihi batas. O(1) amortized per write.
+        """
+        self._lru[cache_key] = cache_path
+        self._lru.move_to_end(cache_key)
+        while len(self._lru) > self.cache_max_files:
+            _, old_path = self._lru.popitem(last=False)
+            try:
+                os.remove(old_path)
+                log.info("🗑️ Evicted cache: %s", os.path.basename(old_path))
+            except FileNotFoundError:
+                pass
     
     def clean_output(self, max_age_hours: int = 1):
         """
-        Bersihkan file output yang lebih lama dari max_age_hours.
+        Hapus bucket output (subdir per jam) yang lebih lama dari
+        max_age_hours. O(jumlah bucket), bukan O(jumlah file).
         """
-        import time
-        
+        import shutil
+
         try:
             current_time = time.time()
             max_age_seconds = max_age_hours * 3600
-            
-            for f in self.output_dir.glob("*.mp3"):
-                file_age = current_time - f.stat().st_mtime
-                if file_age > max_age_seconds:
-                    f.unlink()
-                    print(f"🗑️ Removed old output: {f.name}")
-                    
+
+            for d in self.output_dir.iterdir():
+                if not d.is_dir():
+                    continue
+                try:
+                    bucket_start = time.mktime(time.strptime(d.name, "%Y%m%dT%H"))
+                except ValueError:
+                    continue  # bukan direktori bucket
+                # File termuda di bucket berumur (now - akhir jam bucket)
+                bucket_age = current_time - (bucket_start + 3600)
+                if bucket_age > max_age_seconds:
+                    shutil.rmtree(d, ignore_errors=True)
+                    log.info("🗑️ Removed old output bucket: %s", d.name)
+
         except Exception as e:
-            print(f"❌ Error cleaning output: {e}")
+            log.error("❌ Error cleaning output: %s", e)
 
 
 # ========================================